@@ -13,6 +13,9 @@
 # the License.
 """Pigweed's Sphinx configuration."""
 
+import filecmp
+import os
+
 import sphinx
 import sphinx_rtd_theme
 
@@ -141,7 +144,20 @@ def do_not_skip_init(app, what, name, obj, would_skip, options):
 
 # Problem: CSS files aren't copied after modifying them. Solution:
 # https://github.com/sphinx-doc/sphinx/issues/2090#issuecomment-572902572
+#
+# Only force a rebuild when the built copy of the CSS is missing or stale;
+# unconditionally marking a document as outdated defeats incremental builds.
+_PIGWEED_CSS = os.path.join('css', 'pigweed.css')
+
+
 def env_get_outdated(app, env, added, changed, removed):
+    source = os.path.join(app.confdir, html_static_path[0], _PIGWEED_CSS)
+    built = os.path.join(app.outdir, '_static', _PIGWEED_CSS)
+    try:
+        if filecmp.cmp(source, built):
+            return []
+    except OSError:
+        pass
     return ['index']
 
 
@@ -25,7 +25,7 @@ import subprocess
 import sys
 
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 SCRIPT_HEADER: str = '''
 ██████╗ ██╗ ██████╗ ██╗    ██╗███████╗███████╗██████╗     ██████╗  ██████╗  ██████╗███████╗
@@ -59,6 +59,9 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--out-dir',
                         required=True,
                         help='Output directory for rendered HTML docs')
+    parser.add_argument('--doctree-dir',
+                        help=('Directory in which Sphinx caches its pickled '
+                              'environment; defaults to <out-dir>/help'))
     parser.add_argument('--metadata',
                         required=True,
                         type=argparse.FileType('r'),
@@ -66,14 +69,21 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def build_docs(src_dir: str, dst_dir: str) -> int:
+def build_docs(src_dir: str, dst_dir: str, doctree_dir: Optional[str]) -> int:
     """Runs Sphinx to render HTML documentation from a doc tree."""
 
     # TODO(frolv): Specify the Sphinx script from a prebuilts path instead of
     # requiring it in the tree.
+    #
+    # All of the extensions used by Pigweed's conf.py (autodoc, napoleon, the
+    # blockdiag family, and mermaid) are parallel read and write safe, so let
+    # Sphinx use every available core.
+    if doctree_dir is None:
+        doctree_dir = f'{dst_dir}/help'
+
     command = [
-        'sphinx-build', '-W', '-b', 'html', '-d', f'{dst_dir}/help', src_dir,
-        f'{dst_dir}/html'
+        'sphinx-build', '-W', '-j', 'auto', '-b', 'html', '-d', doctree_dir,
+        src_dir, f'{dst_dir}/html'
     ]
     return subprocess.call(command)
 
@@ -134,7 +144,7 @@ def main() -> int:
     # Flush all script output before running Sphinx.
     print('-' * 80, flush=True)
 
-    return build_docs(args.sphinx_build_dir, args.out_dir)
+    return build_docs(args.sphinx_build_dir, args.out_dir, args.doctree_dir)
 
 
 if __name__ == '__main__':
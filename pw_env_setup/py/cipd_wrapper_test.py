@@ -0,0 +1,139 @@
+# Copyright 2021 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests for the bootstrap marker logic in cipd_setup.wrapper."""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from pw_env_setup.cipd_setup import wrapper
+
+# pylint: disable=protected-access
+
+
+class InitTest(unittest.TestCase):
+    """Tests for wrapper.init() with bootstrap and selfupdate mocked."""
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.client = os.path.join(self.root, 'cipd')
+        self.marker = os.path.join(self.root, '.bootstrap_ok')
+
+        version_file = os.path.join(self.root, '.cipd_version')
+        with open(version_file, 'w') as outs:
+            outs.write('git_revision:1234\n')
+
+        self._patch(wrapper, 'VERSION_FILE', new=version_file)
+        environ = mock.patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        self.bootstrap = self._patch(wrapper,
+                                     'bootstrap',
+                                     side_effect=self._fake_bootstrap)
+        self.selfupdate = self._patch(wrapper, 'selfupdate')
+        self.call = self._patch(wrapper.subprocess, 'call', return_value=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _patch(self, target, attribute, **kwargs):
+        patch = mock.patch.object(target, attribute, **kwargs)
+        self.addCleanup(patch.stop)
+        return patch.start()
+
+    def _fake_bootstrap(self, client, unused_silent=False):
+        with open(client, 'w'):
+            pass
+
+    def _init(self, **kwargs):
+        return wrapper.init(install_dir=self.root,
+                            silent=True,
+                            client=self.client,
+                            **kwargs)
+
+    def _read_marker(self):
+        with open(self.marker, 'r') as ins:
+            return ins.read()
+
+    def test_first_run_bootstraps_and_writes_marker(self):
+        self.assertEqual(self._init(), self.client)
+        self.bootstrap.assert_called_once_with(self.client, True)
+        self.selfupdate.assert_called_once_with(self.client)
+        self.assertEqual(self._read_marker(), 'git_revision:1234')
+
+    def test_current_client_skips_update(self):
+        self._init()
+        self.bootstrap.reset_mock()
+        self.selfupdate.reset_mock()
+
+        self.assertEqual(self._init(), self.client)
+        self.bootstrap.assert_not_called()
+        self.selfupdate.assert_not_called()
+
+    def test_version_change_updates_without_bootstrap(self):
+        self._init()
+        self.bootstrap.reset_mock()
+        self.selfupdate.reset_mock()
+        with open(wrapper.VERSION_FILE, 'w') as outs:
+            outs.write('git_revision:5678\n')
+
+        self._init()
+        self.bootstrap.assert_not_called()
+        self.selfupdate.assert_called_once_with(self.client)
+        self.assertEqual(self._read_marker(), 'git_revision:5678')
+
+    def test_force_bootstraps_current_client(self):
+        self._init()
+        self.bootstrap.reset_mock()
+        self.selfupdate.reset_mock()
+
+        self._init(force=True)
+        self.bootstrap.assert_called_once_with(self.client, True)
+        self.selfupdate.assert_called_once_with(self.client)
+
+    def test_missing_client_is_not_current(self):
+        self._init()
+        os.unlink(self.client)
+        self.assertFalse(wrapper._is_current(self.client))
+
+    def test_broken_client_recovers(self):
+        self._init()
+        self.bootstrap.reset_mock()
+        self.selfupdate.reset_mock()
+
+        # The marker matches, but the client no longer runs and selfupdate
+        # fails once, so init() has to bootstrap and retry.
+        self.call.return_value = 1
+        self.selfupdate.side_effect = [
+            subprocess.CalledProcessError(1, 'cipd'), None
+        ]
+        with mock.patch('sys.stderr'):
+            self._init()
+
+        self.assertEqual(self.bootstrap.call_count, 1)
+        self.assertEqual(self.selfupdate.call_count, 2)
+
+    def test_failed_update_keeps_marker_stale(self):
+        self.selfupdate.side_effect = subprocess.CalledProcessError(1, 'cipd')
+        with mock.patch('sys.stderr'):
+            with self.assertRaises(subprocess.CalledProcessError):
+                self._init()
+        self.assertFalse(os.path.exists(self.marker))
+
+
+if __name__ == '__main__':
+    unittest.main()
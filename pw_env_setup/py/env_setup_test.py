@@ -0,0 +1,180 @@
+# Copyright 2021 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests for helper functions in env_setup."""
+
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pw_env_setup import env_setup
+
+# pylint: disable=super-with-arguments,protected-access
+
+_FILES = (
+    'a.txt',
+    'b.txt',
+    'c.json',
+    '.hidden.txt',
+    os.path.join('sub', 'd.txt'),
+    os.path.join('sub', '.e.txt'),
+)
+
+
+class GroupedGlobTest(unittest.TestCase):
+    """Tests that env_setup._grouped_glob() matches glob.glob()."""
+    def setUp(self):
+        super(GroupedGlobTest, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.old_cwd = os.getcwd()
+        for name in _FILES:
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w'):
+                pass
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.root)
+        super(GroupedGlobTest, self).tearDown()
+
+    def _assert_matches_glob(self, *patterns):
+        result = list(env_setup._grouped_glob(patterns))
+        self.assertEqual([pat for pat, _ in result], list(patterns))
+        for pat, matches in result:
+            self.assertEqual(sorted(matches), sorted(glob.glob(pat)), pat)
+
+    def test_wildcard_basename(self):
+        self._assert_matches_glob(
+            os.path.join(self.root, '*.txt'),
+            os.path.join(self.root, '*'),
+            os.path.join(self.root, 'sub', '*'),
+        )
+
+    def test_hidden_files(self):
+        self._assert_matches_glob(
+            os.path.join(self.root, '.*'),
+            os.path.join(self.root, '.*.txt'),
+            os.path.join(self.root, 'sub', '.*'),
+        )
+
+    def test_wildcard_dirname(self):
+        self._assert_matches_glob(
+            os.path.join(self.root, '*', '*.txt'),
+            os.path.join(self.root, 's?b', 'd.txt'),
+        )
+
+    def test_no_wildcards(self):
+        self._assert_matches_glob(
+            os.path.join(self.root, 'a.txt'),
+            os.path.join(self.root, 'missing.txt'),
+        )
+
+    def test_missing_directory(self):
+        self._assert_matches_glob(
+            os.path.join(self.root, 'missing', '*.txt'),
+            os.path.join(self.root, 'a.txt', '*'),
+        )
+
+    def test_relative_patterns(self):
+        os.chdir(self.root)
+        self._assert_matches_glob('*.txt', '.*', os.path.join('sub', '*'))
+
+
+class WriteFilesTest(unittest.TestCase):
+    """Tests for env_setup._write_files()."""
+    def setUp(self):
+        super(WriteFilesTest, self).setUp()
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(WriteFilesTest, self).tearDown()
+
+    def test_writes_all_files(self):
+        paths = [os.path.join(self.root, x) for x in ('a', 'b', 'c')]
+        env_setup._write_files((path, path) for path in paths)
+        for path in paths:
+            with open(path, 'r') as ins:
+                self.assertEqual(ins.read(), path)
+        self.assertEqual(sorted(os.listdir(self.root)), ['a', 'b', 'c'])
+
+    def test_error_propagates_and_cleans_up(self):
+        good = os.path.join(self.root, 'good')
+        bad = os.path.join(self.root, 'bad')
+        # Lone surrogates can't be encoded, whatever the locale.
+        with self.assertRaises(UnicodeEncodeError):
+            env_setup._write_files([(good, 'good'), (bad, u'bad \udcff')])
+        self.assertEqual(os.listdir(self.root), ['good'])
+
+    def test_os_error_propagates(self):
+        missing = os.path.join(self.root, 'missing', 'file')
+        with self.assertRaises((IOError, OSError)):
+            env_setup._write_files([(missing, 'contents')])
+
+
+class RefreshCopyTest(unittest.TestCase):
+    """Tests for env_setup._refresh_copy()."""
+    def setUp(self):
+        super(RefreshCopyTest, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.src = os.path.join(self.root, 'python3.exe')
+        self.dst = os.path.join(self.root, 'python.exe')
+        with open(self.src, 'w') as outs:
+            outs.write('new')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(RefreshCopyTest, self).tearDown()
+
+    def _read_dst(self):
+        with open(self.dst, 'r') as ins:
+            return ins.read()
+
+    def test_creates_copy(self):
+        env_setup._refresh_copy(self.src, self.dst)
+        self.assertEqual(self._read_dst(), 'new')
+        self.assertFalse(env_setup._is_stale_copy(self.src, self.dst))
+
+    def test_replaces_stale_copy(self):
+        with open(self.dst, 'w') as outs:
+            outs.write('old')
+        env_setup._refresh_copy(self.src, self.dst)
+        self.assertEqual(self._read_dst(), 'new')
+
+    def test_keeps_copy_in_use(self):
+        with open(self.dst, 'w') as outs:
+            outs.write('old')
+        with mock.patch.object(env_setup,
+                               '_replace',
+                               side_effect=OSError('in use')):
+            env_setup._refresh_copy(self.src, self.dst)
+        self.assertEqual(self._read_dst(), 'old')
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         ['python.exe', 'python3.exe'])
+
+    def test_missing_copy_error_propagates(self):
+        with mock.patch.object(env_setup,
+                               '_replace',
+                               side_effect=OSError('denied')):
+            with self.assertRaises(OSError):
+                env_setup._refresh_copy(self.src, self.dst)
+        self.assertEqual(os.listdir(self.root), ['python3.exe'])
+
+
+if __name__ == '__main__':
+    unittest.main()
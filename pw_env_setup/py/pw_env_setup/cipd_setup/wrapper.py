@@ -327,15 +327,58 @@ def _default_client(install_dir):
     return client
 
 
-def init(install_dir=DEFAULT_INSTALL_DIR, silent=False, client=None):
-    """Install/update cipd client."""
+def _bootstrap_marker(client):
+    return os.path.join(os.path.dirname(client), '.bootstrap_ok')
+
+
+def _read_version_file():
+    with open(VERSION_FILE, 'r') as ins:
+        return ins.read().strip()
+
+
+def _is_current(client):
+    """Returns True if client was already updated to the pinned version."""
+
+    if not os.path.isfile(client):
+        return False
+
+    try:
+        with open(_bootstrap_marker(client), 'r') as ins:
+            if ins.read().strip() != _read_version_file():
+                return False
+    except (IOError, OSError):
+        return False
+
+    # Make sure the client still runs. If it doesn't, init() goes through the
+    # usual selfupdate and bootstrap recovery instead of skipping them.
+    with open(os.devnull, 'w') as devnull:
+        try:
+            return subprocess.call([client, 'version'],
+                                   stdout=devnull,
+                                   stderr=devnull) == 0
+        except OSError:
+            return False
+
+
+def init(install_dir=DEFAULT_INSTALL_DIR,
+         silent=False,
+         client=None,
+         force=False):
+    """Install/update cipd client.
+
+    The client is only updated if it was not already updated to the version in
+    VERSION_FILE by a previous call, unless force is True.
+    """
 
     if not client:
         client = _default_client(install_dir)
 
     os.environ['CIPD_HTTP_USER_AGENT_PREFIX'] = user_agent()
 
-    if not os.path.isfile(client):
+    if not force and _is_current(client):
+        return client
+
+    if force or not os.path.isfile(client):
         bootstrap(client, silent)
 
     try:
@@ -346,6 +389,9 @@ def init(install_dir=DEFAULT_INSTALL_DIR, silent=False, client=None):
         bootstrap(client)
         selfupdate(client)
 
+    with open(_bootstrap_marker(client), 'w') as marker:
+        marker.write(_read_version_file())
+
     return client
 
 
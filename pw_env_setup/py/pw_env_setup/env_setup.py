@@ -25,14 +25,30 @@ with PyOxidizer it can be upgraded to recent Python 3.
 from __future__ import print_function
 
 import argparse
-import copy
+import collections
+import errno
+import fnmatch
 import glob
-import inspect
 import json
 import os
 import shutil
 import subprocess
 import sys
+import threading
+
+# The order here is important. On Python 2 we want StringIO.StringIO and not
+# io.StringIO. On Python 3 there is no StringIO module so we want io.StringIO.
+try:
+    from StringIO import StringIO  # type: ignore
+except ImportError:
+    from io import StringIO
+
+# typing is only used for type comments, and isn't available on Python 2
+# unless the backport is installed.
+try:
+    from typing import Dict, FrozenSet, Tuple
+except ImportError:
+    pass
 
 # TODO(pwbug/67): Remove import hacks once the oxidized prebuilt binaries are
 # proven stable for first-time bootstrapping. For now, continue to support
@@ -42,15 +58,16 @@ import sys
 # If we're running oxidized, filesystem-centric import hacks won't work. In that
 # case, jump straight to the imports and assume oxidation brought in the deps.
 if not getattr(sys, 'oxidized', False):
-    old_sys_path = copy.deepcopy(sys.path)
+    old_sys_path = list(sys.path)
     filename = None
     if hasattr(sys.modules[__name__], '__file__'):
         filename = __file__
     else:
-        # Try introspection in environments where __file__ is not populated.
-        frame = inspect.currentframe()
-        if frame is not None:
-            filename = inspect.getfile(frame)
+        # Try the module spec in environments where __file__ is not populated.
+        # __spec__ doesn't exist in Python 2, so look it up in globals().
+        spec = globals().get('__spec__')
+        if spec is not None:
+            filename = spec.origin
     # If none of our strategies worked, we're in a strange runtime environment.
     # The imports are almost certainly going to fail.
     if filename is None:
@@ -74,12 +91,52 @@ from pw_env_setup import spinner
 from pw_env_setup import virtualenv_setup
 from pw_env_setup import windows_env_start
 
+# Skipping sysname and nodename in os.uname(). nodename could change based on
+# the current network. sysname won't change, but is redundant because it's
+# contained in release or version, and skipping it here simplifies logic.
+_UNAME = ' '.join(os.uname()[2:]) if hasattr(os, 'uname') else ''
+
+# Directory listings used by _which_py2(), keyed by (path, case_sensitive).
+# Each entry also records the directory's mtime so listings are refreshed if
+# something (e.g., the CIPD step) adds files to a directory between lookups.
+_LISTDIR_CACHE = {}  # type: Dict[tuple, Tuple[float, FrozenSet[str]]]
+
+
+def _listdir(path, case_sensitive):
+    mtime = os.stat(path).st_mtime
+    key = (path, case_sensitive)
+    cached = _LISTDIR_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    entries = frozenset(os.listdir(path))
+    if not case_sensitive:
+        entries = frozenset(x.lower() for x in entries)
+    _LISTDIR_CACHE[key] = (mtime, entries)
+    return entries
+
+
+# Parsed PATHEXT values used by _which_py2(), keyed by (PATHEXT, pathsep,
+# case_sensitive).
+_PATHEXT_CACHE = {}  # type: Dict[Tuple[str, str, bool], FrozenSet[str]]
+
+
+def _pathexts(pathext, pathsep, case_sensitive):
+    key = (pathext, pathsep, case_sensitive)
+    if key not in _PATHEXT_CACHE:
+        exts = pathext.split(pathsep)
+        if not case_sensitive:
+            exts = (x.lower() for x in exts)
+        _PATHEXT_CACHE[key] = frozenset(exts)
+    return _PATHEXT_CACHE[key]
+
 
-# TODO(pwbug/67, pwbug/68) switch to shutil.which().
-def _which(executable,
-           pathsep=os.pathsep,
-           use_pathext=None,
-           case_sensitive=None):
+# TODO(pwbug/67, pwbug/68) remove this fallback once Python 2 is no longer
+# supported and call shutil.which() directly.
+def _which_py2(executable,
+               pathsep=os.pathsep,
+               use_pathext=None,
+               case_sensitive=None):
     if use_pathext is None:
         use_pathext = (os.name == 'nt')
     if case_sensitive is None:
@@ -90,18 +147,14 @@ def _which(executable,
 
     exts = None
     if use_pathext:
-        exts = frozenset(os.environ['PATHEXT'].split(pathsep))
-        if not case_sensitive:
-            exts = frozenset(x.lower() for x in exts)
+        exts = _pathexts(os.environ['PATHEXT'], pathsep, case_sensitive)
         if not exts:
             raise ValueError('empty PATHEXT')
 
     paths = os.environ['PATH'].split(pathsep)
     for path in paths:
         try:
-            entries = frozenset(os.listdir(path))
-            if not case_sensitive:
-                entries = frozenset(x.lower() for x in entries)
+            entries = _listdir(path, case_sensitive)
         except OSError:
             continue
 
@@ -116,6 +169,127 @@ def _which(executable,
     return None
 
 
+_which = getattr(shutil, 'which', _which_py2)
+
+
+def _grouped_glob(patterns):
+    """Yields (pattern, matches) pairs, listing each directory only once.
+
+    Config files tend to list many patterns in the same directory, and
+    glob.glob() would re-list that directory for every pattern. Patterns with
+    wildcards in their directory component are passed through to glob.glob().
+    """
+    # Maps each directory to a pair of (all names, names of non-hidden files).
+    listings = {}
+    for pat in patterns:
+        dirname, basename = os.path.split(pat)
+        if glob.has_magic(dirname) or not glob.has_magic(basename):
+            yield pat, glob.glob(pat)
+            continue
+
+        if dirname not in listings:
+            try:
+                names = os.listdir(dirname or os.curdir)
+            except OSError:
+                names = []
+            listings[dirname] = (names,
+                                 [x for x in names if not x.startswith('.')])
+
+        # Match glob.glob(), which skips hidden files unless asked for them.
+        all_names, visible_names = listings[dirname]
+        names = all_names if basename.startswith('.') else visible_names
+        yield pat, [
+            os.path.join(dirname, x) for x in fnmatch.filter(names, basename)
+        ]
+
+
+def _render(write):
+    """Returns what write() writes to the stream it is given as a string."""
+    buf = StringIO()
+    write(buf)
+    return buf.getvalue()
+
+
+def _is_stale_copy(src, dst):
+    """Returns True if dst is missing or isn't a shutil.copy2() copy of src."""
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        return True
+    src_stat = os.stat(src)
+    # Compare whole seconds since Python 2 can't always preserve mtimes
+    # exactly.
+    return ((src_stat.st_size, int(src_stat.st_mtime)) !=
+            (dst_stat.st_size, int(dst_stat.st_mtime)))
+
+
+def _remove_if_exists(path):
+    # TODO(pwbug/67, pwbug/68) use contextlib.suppress(FileNotFoundError) once
+    # Python 2 is no longer supported.
+    try:
+        os.unlink(path)
+    except OSError as err:
+        if err.errno != errno.ENOENT:
+            raise
+
+
+def _replace(src, dst):
+    # TODO(pwbug/67, pwbug/68) use os.replace() directly once Python 2 is no
+    # longer supported. On Windows, os.rename() fails if dst exists.
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+        return
+    if os.name == 'nt':
+        _remove_if_exists(dst)
+    os.rename(src, dst)
+
+
+def _refresh_copy(src, dst):
+    """Replaces dst with a shutil.copy2() copy of src.
+
+    If dst already exists but can't be replaced it's kept as is. On Windows
+    this happens when dst is the running interpreter.
+    """
+    tmp = '{}.tmp'.format(dst)
+    shutil.copy2(src, tmp)
+    try:
+        _replace(tmp, dst)
+    except OSError:
+        _remove_if_exists(tmp)
+        if not os.path.exists(dst):
+            raise
+
+
+def _write_files(outputs):
+    """Writes each (path, contents) pair in outputs concurrently.
+
+    Contents are first written to a temporary file next to path and then moved
+    into place, so an interrupted setup never leaves a partially written file.
+    """
+    errors = []
+
+    def write(path, contents):
+        tmp = '{}.tmp'.format(path)
+        try:
+            with open(tmp, 'w') as outs:
+                outs.write(contents)
+            _replace(tmp, path)
+        # Anything raised here would otherwise only kill this thread, so record
+        # it and re-raise it from the calling thread.
+        except Exception as exc:  # pylint: disable=broad-except
+            errors.append(exc)
+            _remove_if_exists(tmp)
+
+    threads = [threading.Thread(target=write, args=x) for x in outputs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
 class _Result:
     class Status:
         DONE = 'done'
@@ -159,7 +333,8 @@ class EnvSetup(object):
     """Run environment setup for Pigweed."""
     def __init__(self, pw_root, cipd_cache_dir, shell_file, quiet, install_dir,
                  virtualenv_root, strict, virtualenv_gn_out_dir, json_file,
-                 project_root, config_file, use_existing_cipd):
+                 project_root, config_file, use_existing_cipd,
+                 force_cipd_bootstrap):
         self._env = environment.Environment()
         self._project_root = project_root
         self._pw_root = pw_root
@@ -174,12 +349,18 @@ class EnvSetup(object):
                                  or os.path.join(install_dir, 'pigweed-venv'))
         self._strict = strict
 
-        if os.path.isfile(shell_file):
-            os.unlink(shell_file)
+        _remove_if_exists(shell_file)
 
         if isinstance(self._pw_root, bytes) and bytes != str:
             self._pw_root = self._pw_root.decode()
 
+        self._cipd_install_dir = os.path.join(install_dir, 'cipd')
+        self._config_json = os.path.join(install_dir, 'config.json')
+        self._host_tools_dir = os.path.join(self._pw_root, 'out', 'host',
+                                            'host_tools')
+        self._win_scripts_dir = os.path.join(self._pw_root, 'pw_env_setup',
+                                             'windows_scripts')
+
         self._cipd_package_file = []
         self._virtualenv_requirements = []
         self._virtualenv_gn_targets = []
@@ -193,6 +374,7 @@ class EnvSetup(object):
             self._json_file = os.path.join(self._install_dir, 'actions.json')
 
         self._use_existing_cipd = use_existing_cipd
+        self._force_cipd_bootstrap = force_cipd_bootstrap
         self._virtualenv_gn_out_dir = virtualenv_gn_out_dir
 
         self._env.set('PW_PROJECT_ROOT', project_root)
@@ -202,23 +384,20 @@ class EnvSetup(object):
         self._env.add_replacement('PW_ROOT', pw_root)
 
     def _process_globs(self, globs):
-        unique_globs = []
-        for pat in globs:
-            if pat and pat not in unique_globs:
-                unique_globs.append(pat)
+        # OrderedDict rather than dict because dicts aren't ordered in Python 2.
+        unique_globs = list(
+            collections.OrderedDict.fromkeys(x for x in globs if x))
 
         files = []
         warnings = []
-        for pat in unique_globs:
-            if pat:
-                matches = glob.glob(pat)
-                if not matches:
-                    warning = 'pattern "{}" matched 0 files'.format(pat)
-                    warnings.append('warning: {}'.format(warning))
-                    if self._strict:
-                        raise ConfigError(warning)
+        for pat, matches in _grouped_glob(unique_globs):
+            if not matches:
+                warning = 'pattern "{}" matched 0 files'.format(pat)
+                warnings.append('warning: {}'.format(warning))
+                if self._strict:
+                    raise ConfigError(warning)
 
-                files.extend(matches)
+            files.extend(matches)
 
         if globs and not files:
             warnings.append('warning: matched 0 total files')
@@ -273,6 +452,12 @@ class EnvSetup(object):
         else:
             enable_colors()
 
+        # Steps run serially and in this order on purpose. The virtualenv step
+        # uses the Python that CIPD installs, and because each step prepends to
+        # PATH, later steps take precedence over earlier ones (e.g., host tools
+        # from a local build shadow the ones from CIPD). host_tools() and
+        # win_scripts() only record environment changes, so there is nothing
+        # to gain by running them concurrently with the other steps.
         steps = [
             ('CIPD package manager', self.cipd),
             ('Python environment', self.virtualenv),
@@ -287,6 +472,9 @@ class EnvSetup(object):
                        'source directory:\n'))
 
         max_name_len = max(len(name) for name, _ in steps)
+        name_field = '{{:.<{}}}...'.format(max_name_len)
+        log_template = '  Setting up ' + name_field
+        echo_template = '  Setting environment variables for ' + name_field
 
         self._env.comment('''
 This file is automatically generated. DO NOT EDIT!
@@ -307,15 +495,8 @@ Then use `set +x` to go back to normal.
         self._env.echo('')
 
         for name, step in steps:
-            self._log('  Setting up {name:.<{width}}...'.format(
-                name=name, width=max_name_len),
-                      end='',
-                      flush=True)
-            self._env.echo(
-                '  Setting environment variables for {name:.<{width}}...'.
-                format(name=name, width=max_name_len),
-                newline=False,
-            )
+            self._log(log_template.format(name), end='', flush=True)
+            self._env.echo(echo_template.format(name), newline=False)
 
             spin = spinner.Spinner()
             with spin():
@@ -324,8 +505,10 @@ Then use `set +x` to go back to normal.
             self._log(result.status_str())
 
             self._env.echo(result.status_str())
-            for message in result.messages():
-                sys.stderr.write('{}\n'.format(message))
+            messages = result.messages()
+            if messages:
+                sys.stderr.write(''.join('{}\n'.format(x) for x in messages))
+            for message in messages:
                 self._env.echo(message)
 
             if not result.ok():
@@ -346,39 +529,35 @@ Then use `set +x` to go back to normal.
             Color.bold('Environment looks good, you are ready to go!'))
         self._env.echo()
 
-        with open(self._shell_file, 'w') as outs:
-            self._env.write(outs)
-
         deactivate = os.path.join(
             self._install_dir,
             'deactivate{}'.format(os.path.splitext(self._shell_file)[1]))
-        with open(deactivate, 'w') as outs:
-            self._env.write_deactivate(outs)
 
         config = {
-            # Skipping sysname and nodename in os.uname(). nodename could change
-            # based on the current network. sysname won't change, but is
-            # redundant because it's contained in release or version, and
-            # skipping it here simplifies logic.
-            'uname': ' '.join(getattr(os, 'uname', lambda: ())()[2:]),
+            'uname': _UNAME,
             'os': os.name,
         }
 
-        with open(os.path.join(self._install_dir, 'config.json'), 'w') as outs:
-            outs.write(
-                json.dumps(config, indent=4, separators=(',', ': ')) + '\n')
+        def write_config(outs):
+            json.dump(config, outs, indent=4, separators=(',', ': '))
+            outs.write('\n')
+
+        outputs = [
+            (self._shell_file, _render(self._env.write)),
+            (deactivate, _render(self._env.write_deactivate)),
+            (self._config_json, _render(write_config)),
+        ]
 
         if self._json_file is not None:
-            with open(self._json_file, 'w') as outs:
-                self._env.json(outs)
+            outputs.append((self._json_file, _render(self._env.json)))
+
+        _write_files(outputs)
 
         return 0
 
     def cipd(self, spin):
         """Set up cipd and install cipd packages."""
 
-        install_dir = os.path.join(self._install_dir, 'cipd')
-
         # There's no way to get to the UnsupportedPlatform exception if this
         # flag is set, but this flag should only be set in LUCI builds which
         # will always have CIPD.
@@ -387,7 +566,11 @@ Then use `set +x` to go back to normal.
 
         else:
             try:
-                cipd_client = cipd_wrapper.init(install_dir, silent=True)
+                cipd_client = cipd_wrapper.init(
+                    self._cipd_install_dir,
+                    silent=True,
+                    force=self._force_cipd_bootstrap,
+                )
             except cipd_wrapper.UnsupportedPlatform as exc:
                 return result_func(('    {!r}'.format(exc), ))(
                     _Result.Status.SKIPPED,
@@ -402,7 +585,7 @@ Then use `set +x` to go back to normal.
             return result(_Result.Status.SKIPPED)
 
         if not cipd_update.update(cipd=cipd_client,
-                                  root_install_dir=install_dir,
+                                  root_install_dir=self._cipd_install_dir,
                                   package_files=package_files,
                                   cache_dir=self._cipd_cache_dir,
                                   env_vars=self._env,
@@ -430,8 +613,8 @@ Then use `set +x` to go back to normal.
         if orig_python3 != new_python3 and self._is_windows:
             python3_copy = os.path.join(os.path.dirname(new_python3),
                                         'python.exe')
-            if not os.path.exists(python3_copy):
-                shutil.copyfile(new_python3, python3_copy)
+            if _is_stale_copy(new_python3, python3_copy):
+                _refresh_copy(new_python3, python3_copy)
             new_python3 = python3_copy
 
         if not requirements and not self._virtualenv_gn_targets:
@@ -454,15 +637,12 @@ Then use `set +x` to go back to normal.
         # The host tools are grabbed from CIPD, at least initially. If the
         # user has a current host build, that build will be used instead.
         # TODO(mohrr) find a way to do stuff like this for all projects.
-        host_dir = os.path.join(self._pw_root, 'out', 'host')
-        self._env.prepend('PATH', os.path.join(host_dir, 'host_tools'))
+        self._env.prepend('PATH', self._host_tools_dir)
         return _Result(_Result.Status.DONE)
 
     def win_scripts(self, unused_spin):
         # These scripts act as a compatibility layer for windows.
-        env_setup_dir = os.path.join(self._pw_root, 'pw_env_setup')
-        self._env.prepend('PATH', os.path.join(env_setup_dir,
-                                               'windows_scripts'))
+        self._env.prepend('PATH', self._win_scripts_dir)
         return _Result(_Result.Status.DONE)
 
 
@@ -552,6 +732,13 @@ def parse(argv=None):
         action='store_true',
     )
 
+    parser.add_argument(
+        '--force-cipd-bootstrap',
+        help=('Download and update the cipd client even if it is already at '
+              'the pinned version.'),
+        action='store_true',
+    )
+
     parser.add_argument(
         '--strict',
         help='Fail if there are any warnings.',
@@ -16,13 +16,12 @@
 from __future__ import print_function
 
 import datetime
-import glob
+import itertools
 import os
 import re
 import shutil
 import subprocess
 import sys
-import tempfile
 
 # Grabbing datetime string once so it will always be the same for all GnTarget
 # objects.
@@ -32,8 +31,16 @@ _DATETIME_STRING = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
 class GnTarget(object):  # pylint: disable=useless-object-inheritance
     def __init__(self, val):
         self.directory, self.target = val.split('#', 1)
-        self.name = '-'.join(
-            (re.sub(r'\W+', '_', self.target).strip('_'), _DATETIME_STRING))
+
+
+def _log_name(gn_targets):
+    """Returns the name used in log files for a build of gn_targets."""
+    # Only name the first target so the file names stay short, however many
+    # targets are built together.
+    name = re.sub(r'\W+', '_', gn_targets[0].target).strip('_')
+    if len(gn_targets) > 1:
+        name += '-and-{}-more'.format(len(gn_targets) - 1)
+    return '{}-{}'.format(name, _DATETIME_STRING)
 
 
 def git_stdout(*args, **kwargs):
@@ -74,19 +81,39 @@ def _required_packages(requirements):
 
 
 # TODO(pwbug/135) Move to common utility module.
+def _decode(output):
+    # Tools don't always write valid UTF-8, and a log with a few replaced
+    # characters is more useful than a UnicodeDecodeError.
+    return output.decode('utf-8', 'replace')
+
+
 def _check_call(args, **kwargs):
     stdout = kwargs.get('stdout', sys.stdout)
 
-    with tempfile.TemporaryFile(mode='w+') as temp:
-        try:
-            kwargs['stdout'] = temp
-            kwargs['stderr'] = subprocess.STDOUT
-            print(args, kwargs, file=temp)
-            subprocess.check_call(args, **kwargs)
-        except subprocess.CalledProcessError:
-            temp.seek(0)
-            stdout.write(temp.read())
-            raise
+    # Collect the output in memory rather than in a temporary file. It is
+    # only shown if the command fails.
+    popen_kwargs = dict(kwargs)
+    popen_kwargs['stdout'] = subprocess.PIPE
+    popen_kwargs['stderr'] = subprocess.STDOUT
+    proc = subprocess.Popen(args, **popen_kwargs)
+    output, _ = proc.communicate()
+
+    if proc.returncode:
+        print(args, kwargs, file=stdout)
+        stdout.write(_decode(output))
+        raise subprocess.CalledProcessError(proc.returncode, args)
+
+    return output
+
+
+def _uv():
+    """Returns the path to uv if it should be used instead of pip."""
+    if 'PW_ENVSETUP_USE_UV' not in os.environ:
+        return None
+    # shutil.which() doesn't exist in Python 2, so uv isn't supported there.
+    if not hasattr(shutil, 'which'):
+        return None
+    return shutil.which('uv')
 
 
 def _find_files_by_name(roots, name, allow_nesting=False):
@@ -106,16 +133,31 @@ def _find_files_by_name(roots, name, allow_nesting=False):
     return matches
 
 
+def _egg_links(venv_path):
+    """Yields the paths of lib/python*/site-packages/*.egg-link in venv_path."""
+    lib = os.path.join(venv_path, 'lib')
+    if not os.path.isdir(lib):
+        return
+
+    for python in os.listdir(lib):
+        site_packages = os.path.join(lib, python, 'site-packages')
+        if not python.startswith('python') or not os.path.isdir(site_packages):
+            continue
+
+        for name in os.listdir(site_packages):
+            if name.endswith('.egg-link'):
+                yield os.path.join(site_packages, name)
+
+
 def _check_venv(python, version, venv_path, pyvenv_cfg):
     # Check if the python location and version used for the existing virtualenv
     # is the same as the python we're using. If it doesn't match, we need to
     # delete the existing virtualenv and start again.
     if os.path.exists(pyvenv_cfg):
-        pyvenv_values = {}
         with open(pyvenv_cfg, 'r') as ins:
-            for line in ins:
-                key, value = line.strip().split(' = ', 1)
-                pyvenv_values[key] = value
+            lines = ins.read().splitlines()
+        pyvenv_values = dict(line.strip().split(' = ', 1) for line in lines
+                             if ' = ' in line)
         if os.path.dirname(python) != pyvenv_values.get('home'):
             shutil.rmtree(venv_path)
         elif pyvenv_values.get('version') not in version:
@@ -184,42 +226,59 @@ def install(
     # installed location". This gets around that. The egg-link files
     # all come from 'pw'-prefixed packages we installed with --editable.
     # Source: https://stackoverflow.com/a/48972085
-    for egg_link in glob.glob(
-            os.path.join(venv_path, 'lib/python*/site-packages/*.egg-link')):
+    for egg_link in _egg_links(venv_path):
         os.unlink(egg_link)
 
     def pip_install(*args):
         cmd = [venv_python, '-m', 'pip', 'install'] + list(args)
         return _check_call(cmd)
 
-    pip_install('--upgrade', 'pip')
+    requirement_args = tuple('--requirement={}'.format(req)
+                             for req in requirements)
 
-    if requirements:
-        requirement_args = tuple('--requirement={}'.format(req)
-                                 for req in requirements)
-        pip_install('--log', os.path.join(venv_path, 'pip-requirements.log'),
-                    *requirement_args)
+    pip_log = os.path.join(venv_path, 'pip-requirements.log')
 
-    def install_packages(gn_target):
+    uv = _uv()
+    if uv:
+        # uv resolves and downloads in parallel, so do everything in one call.
+        # pip is still upgraded since GN targets install packages with it, but
+        # like the pip path below, requirements that are already satisfied are
+        # left alone. uv has no --log option, so save its output instead.
+        cmd = [uv, 'pip', 'install', '--python', venv_python]
+        output = _check_call(cmd + ['--upgrade-package', 'pip', 'pip'] +
+                             list(requirement_args))
+        if requirements:
+            with open(pip_log, 'w') as outs:
+                outs.write(_decode(output))
+
+    else:
+        pip_install('--upgrade', 'pip')
+
+        if requirements:
+            pip_install('--log', pip_log, *requirement_args)
+
+    def install_packages(directory, targets):
         if gn_out_dir is None:
             build_dir = os.path.join(project_root, 'out')
         else:
             build_dir = gn_out_dir
 
-        env_log = 'env-{}.log'.format(gn_target.name)
+        name = _log_name(targets)
+
+        env_log = 'env-{}.log'.format(name)
         env_log_path = os.path.join(venv_path, env_log)
+        lines = []
+        for key, value in sorted(os.environ.items()):
+            if key.upper().endswith('PATH'):
+                lines.append('{} =\n'.format(key))
+                lines.extend('    {}\n'.format(entry)
+                             for entry in value.split(os.pathsep))
+            else:
+                lines.append('{} = {}\n'.format(key, value))
         with open(env_log_path, 'w') as outs:
-            for key, value in sorted(os.environ.items()):
-                if key.upper().endswith('PATH'):
-                    print(key, '=', file=outs)
-                    # pylint: disable=invalid-name
-                    for v in value.split(os.pathsep):
-                        print('   ', v, file=outs)
-                    # pylint: enable=invalid-name
-                else:
-                    print(key, '=', value, file=outs)
-
-        gn_log = 'gn-gen-{}.log'.format(gn_target.name)
+            outs.writelines(lines)
+
+        gn_log = 'gn-gen-{}.log'.format(name)
         gn_log_path = os.path.join(venv_path, gn_log)
         try:
             with open(gn_log_path, 'w') as outs:
@@ -233,7 +292,7 @@ def install(
                 print(gn_cmd, file=outs)
                 subprocess.check_call(gn_cmd,
                                       cwd=os.path.join(project_root,
-                                                       gn_target.directory),
+                                                       directory),
                                       stdout=outs,
                                       stderr=outs)
         except subprocess.CalledProcessError as err:
@@ -241,12 +300,12 @@ def install(
                 raise subprocess.CalledProcessError(err.returncode, err.cmd,
                                                     ins.read())
 
-        ninja_log = 'ninja-{}.log'.format(gn_target.name)
+        ninja_log = 'ninja-{}.log'.format(name)
         ninja_log_path = os.path.join(venv_path, ninja_log)
         try:
             with open(ninja_log_path, 'w') as outs:
                 ninja_cmd = ['ninja', '-C', build_dir, '-v']
-                ninja_cmd.append(gn_target.target)
+                ninja_cmd.extend(x.target for x in targets)
                 print(ninja_cmd, file=outs)
                 subprocess.check_call(ninja_cmd, stdout=outs, stderr=outs)
         except subprocess.CalledProcessError as err:
@@ -254,6 +313,17 @@ def install(
                 raise subprocess.CalledProcessError(err.returncode, err.cmd,
                                                     ins.read())
 
+    def install_all_packages():
+        # Build consecutive targets in the same directory with a single gn gen
+        # and ninja invocation so ninja can run their steps in parallel.
+        # Targets are still built in the order given, and running several gn
+        # or ninja processes on the same build directory at once isn't safe.
+        for directory, targets in itertools.groupby(
+                gn_targets, key=lambda target: target.directory):
+            install_packages(directory, list(targets))
+
+        # Only the final set of installed packages is worth logging, so run
+        # pip list once after all of the builds.
         with open(os.path.join(venv_path, 'pip-list.log'), 'w') as outs:
             subprocess.check_call(
                 [venv_python, '-m', 'pip', 'list'],
@@ -267,10 +337,8 @@ def install(
             env.clear('PYTHONHOME')
             env.clear('__PYVENV_LAUNCHER__')
             with env():
-                for gn_target in gn_targets:
-                    install_packages(gn_target)
+                install_all_packages()
         else:
-            for gn_target in gn_targets:
-                install_packages(gn_target)
+            install_all_packages()
 
     return True
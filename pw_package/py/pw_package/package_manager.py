@@ -71,6 +71,11 @@ def register(package_class: type, *args, **kwargs) -> None:
     _PACKAGES[obj.name] = obj
 
 
+def is_registered(name: str) -> bool:
+    """Returns True if a package with the given name has been registered."""
+    return name in _PACKAGES
+
+
 @dataclasses.dataclass
 class Packages:
     all: Tuple[str, ...]
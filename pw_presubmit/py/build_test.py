@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Copyright 2021 The Pigweed Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Tests for functions in the build module."""
+
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+from pw_presubmit import build
+
+
+class CompileCommandsTest(unittest.TestCase):
+    """Tests checking for files in compile_commands.json."""
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._temp_dir.name).resolve()
+        self.out = self.root / 'out'
+        self.out.mkdir()
+        self.compile_commands = self.out / 'compile_commands.json'
+
+        for name in ('absolute.cc', 'relative.cc', 'missing.cc', 'header.h'):
+            (self.root / name).touch()
+
+        self.compile_commands.write_text(
+            json.dumps([
+                {
+                    'directory': str(self.out),
+                    'file': str(self.root / 'absolute.cc'),
+                    'command': 'clang++ -c absolute.cc',
+                },
+                {
+                    'directory': str(self.out),
+                    'file': '../relative.cc',
+                    'arguments': ['clang++', '-c', '../relative.cc'],
+                },
+            ]))
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_compiled_files(self):
+        self.assertEqual(
+            list(build.compiled_files(self.compile_commands)),
+            [self.root / 'absolute.cc', self.root / 'relative.cc'])
+
+    def test_check_compile_commands_for_files(self):
+        files = [
+            self.root / name for name in ('absolute.cc', 'relative.cc',
+                                          'missing.cc', 'header.h')
+        ]
+        self.assertEqual(
+            build.check_compile_commands_for_files(self.compile_commands,
+                                                   files),
+            [self.root / 'missing.cc'])
+
+    def test_multiple_compile_commands(self):
+        other = self.out / 'other.json'
+        other.write_text(
+            json.dumps([{
+                'directory': str(self.root),
+                'file': 'missing.cc',
+            }]))
+
+        self.assertEqual(
+            build.check_compile_commands_for_files(
+                [self.compile_commands, other],
+                [self.root / 'relative.cc', self.root / 'missing.cc']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,7 @@
 """Functions for building code during presubmit checks."""
 
 import collections
+from concurrent import futures
 import contextlib
 import itertools
 import json
@@ -22,8 +23,8 @@ import os
 from pathlib import Path
 import re
 import subprocess
-from typing import (Collection, Container, Dict, Iterable, List, Mapping, Set,
-                    Tuple, Union)
+from typing import (Collection, Container, Dict, Iterable, Iterator, List,
+                    Mapping, Set, Tuple, Union)
 
 from pw_package import package_manager
 from pw_presubmit import call, log_run, plural, PresubmitFailure, tools
@@ -33,13 +34,14 @@ _LOG = logging.getLogger(__name__)
 
 def install_package(root: Path, name: str) -> None:
     """Install package with given name in given path."""
-    mgr = package_manager.PackageManager(root)
-
-    if not mgr.list():
+    # Only check the requested package. PackageManager.list() checks the
+    # status of every configured package, which can be slow.
+    if not package_manager.is_registered(name):
         raise PresubmitFailure(
-            'no packages configured, please import your pw_package '
-            'configuration module')
+            f'package {name!r} is not configured, please import your '
+            'pw_package configuration module')
 
+    mgr = package_manager.PackageManager(root)
     if not mgr.status(name):
         mgr.install(name)
 
@@ -150,32 +152,56 @@ def _get_paths_from_command(source_dir: Path, *args, **kwargs) -> Set[Path]:
     return files
 
 
-# Finds string literals with '.' in them.
-_MAYBE_A_PATH = re.compile(r'"([^\n"]+\.[^\n"]+)"')
+# Finds string literals with '.' in them. Only the first '.' after the first
+# character is matched explicitly, so the regex never backtracks over the dots
+# in a long, unterminated literal.
+_MAYBE_A_PATH = re.compile(rb'"([^\n"][^\n".]*\.[^\n"]+)"')
+
+
+def _search_file_for_paths(build_file: Path) -> List[Path]:
+    directory = build_file.parent
+    paths = []
+
+    for string in _MAYBE_A_PATH.finditer(build_file.read_bytes()):
+        path = directory / os.fsdecode(string.group(1))
+        if path.is_file():
+            paths.append(path)
+
+    return paths
 
 
 def _search_files_for_paths(build_files: Iterable[Path]) -> Iterable[Path]:
-    for build_file in build_files:
-        directory = build_file.parent
+    # Most of the time goes to reading the files and stat-ing the paths found
+    # in them, which release the GIL, so threads are enough to overlap them.
+    with futures.ThreadPoolExecutor() as executor:
+        for paths in executor.map(_search_file_for_paths, build_files):
+            yield from paths
 
-        for string in _MAYBE_A_PATH.finditer(build_file.read_text()):
-            path = directory / string.group(1)
-            if path.is_file():
-                yield path
 
+def _read_compile_commands(compile_commands: Path) -> List[Tuple[str, str]]:
+    """Reads the (file, directory) pair from each compile command.
 
-def _read_compile_commands(compile_commands: Path) -> dict:
+    Each entry is reduced as soon as it is parsed, so the parsed objects for
+    the command lines are not kept. json.load() still reads the whole file
+    into memory before parsing it.
+    """
     with compile_commands.open('rb') as fd:
-        return json.load(fd)
+        return json.load(fd,
+                         object_hook=lambda entry:
+                         (entry['file'], entry['directory']))
 
 
-def compiled_files(compile_commands: Path) -> Iterable[Path]:
-    for command in _read_compile_commands(compile_commands):
-        file = Path(command['file'])
-        if file.is_absolute():
-            yield file
+def _compiled_file_names(compile_commands: Path) -> Iterator[str]:
+    for file, directory in _read_compile_commands(compile_commands):
+        if os.path.isabs(file):
+            yield os.path.normpath(file)
         else:
-            yield file.joinpath(command['directory']).resolve()
+            yield os.path.realpath(os.path.join(directory, file))
+
+
+def compiled_files(compile_commands: Path) -> Iterable[Path]:
+    for file in _compiled_file_names(compile_commands):
+        yield Path(file)
 
 
 def check_compile_commands_for_files(
@@ -190,10 +216,13 @@ def check_compile_commands_for_files(
     if isinstance(compile_commands, Path):
         compile_commands = [compile_commands]
 
+    # Compare the paths as strings, which hash much faster than Path objects.
     compiled = frozenset(
         itertools.chain.from_iterable(
-            compiled_files(cmds) for cmds in compile_commands))
-    return [f for f in files if f not in compiled and f.suffix in extensions]
+            _compiled_file_names(cmds) for cmds in compile_commands))
+    return [
+        f for f in files if f.suffix in extensions and str(f) not in compiled
+    ]
 
 
 def check_builds_for_files(
@@ -219,19 +248,33 @@ def check_builds_for_files(
         files; will be empty if there were no missing files
     """
 
-    # Collect all paths in the Bazel builds.
-    bazel_builds: Set[Path] = set()
-    for directory in bazel_dirs:
-        bazel_builds.update(
-            _get_paths_from_command(directory, 'bazel', 'query',
-                                    'kind("source file", //...:*)'))
-
-    # Collect all paths in GN builds.
-    gn_builds: Set[Path] = set()
-
-    for source_dir, output_dir in gn_dirs:
-        gn_builds.update(
-            _get_paths_from_command(source_dir, 'gn', 'desc', output_dir, '*'))
+    # The bazel and gn queries are independent, so run them concurrently.
+    bazel_dirs = list(bazel_dirs)
+    gn_dirs = list(gn_dirs)
+
+    with futures.ThreadPoolExecutor(
+            max_workers=max(1,
+                            len(bazel_dirs) + len(gn_dirs))) as executor:
+        bazel_queries = [
+            executor.submit(_get_paths_from_command, directory, 'bazel',
+                            'query', 'kind("source file", //...:*)')
+            for directory in bazel_dirs
+        ]
+        gn_queries = [
+            executor.submit(_get_paths_from_command, source_dir, 'gn', 'desc',
+                            output_dir, '*')
+            for source_dir, output_dir in gn_dirs
+        ]
+
+        # Collect all paths in the Bazel builds.
+        bazel_builds: Set[Path] = set()
+        for query in bazel_queries:
+            bazel_builds.update(query.result())
+
+        # Collect all paths in GN builds.
+        gn_builds: Set[Path] = set()
+        for query in gn_queries:
+            gn_builds.update(query.result())
 
     gn_builds.update(_search_files_for_paths(gn_build_files))
 
@@ -23,6 +23,8 @@ setuptools.setup(
     description='Presubmit tools and a presubmit script for Pigweed',
     install_requires=[
         'scan-build==2.0.19',
+        # yapf needs toml to read pyproject.toml files.
+        'toml',
         'yapf==0.30.0',
         'pw_cli',
         'pw_package',
@@ -43,19 +43,17 @@ def _generate_method_descriptor(method: ProtoServiceMethod, method_id: int,
                                 output: OutputFile) -> None:
     """Generates a nanopb method descriptor for an RPC method."""
 
-    req_fields = f'{method.request_type().nanopb_name()}_fields'
-    res_fields = f'{method.response_type().nanopb_name()}_fields'
-    impl_method = f'&Implementation::{method.name()}'
+    name = method.name()
+    req = method.request_type().nanopb_name()
+    res = method.response_type().nanopb_name()
 
     output.write_line(
-        f'{RPC_NAMESPACE}::internal::GetNanopbOrRawMethodFor<{impl_method}, '
-        f'{method.type().cc_enum()}, '
-        f'{method.request_type().nanopb_name()}, '
-        f'{method.response_type().nanopb_name()}>(')
+        f'{RPC_NAMESPACE}::internal::GetNanopbOrRawMethodFor<'
+        f'&Implementation::{name}, {method.type().cc_enum()}, {req}, {res}>(')
     with output.indent(4):
-        output.write_line(f'0x{method_id:08x},  // Hash of "{method.name()}"')
-        output.write_line(f'{req_fields},')
-        output.write_line(f'{res_fields}),')
+        output.write_line(f'0x{method_id:08x},  // Hash of "{name}"')
+        output.write_line(f'{req}_fields,')
+        output.write_line(f'{res}_fields),')
 
 
 def _generate_server_writer_alias(output: OutputFile) -> None:
@@ -89,9 +87,11 @@ def _generate_code_for_client_method(method: ProtoServiceMethod,
                                      output: OutputFile) -> None:
     """Outputs client code for a single RPC method."""
 
+    name = method.name()
+    method_type = method.type()
     req = method.request_type().nanopb_name()
     res = method.response_type().nanopb_name()
-    method_id = pw_rpc.ids.calculate(method.name())
+    method_id = pw_rpc.ids.calculate(name)
 
     rpc_error = _CallbackFunction(
         'void(::pw::Status)',
@@ -99,14 +99,14 @@ def _generate_code_for_client_method(method: ProtoServiceMethod,
         'nullptr',
     )
 
-    if method.type() == ProtoServiceMethod.Type.UNARY:
+    if method_type == ProtoServiceMethod.Type.UNARY:
         callbacks = f'{RPC_NAMESPACE}::internal::UnaryCallbacks'
         functions = [
             _CallbackFunction(f'void(const {res}&, ::pw::Status)',
                               'on_response'),
             rpc_error,
         ]
-    elif method.type() == ProtoServiceMethod.Type.SERVER_STREAMING:
+    elif method_type == ProtoServiceMethod.Type.SERVER_STREAMING:
         callbacks = f'{RPC_NAMESPACE}::internal::ServerStreamingCallbacks'
         functions = [
             _CallbackFunction(f'void(const {res}&)', 'on_response'),
@@ -117,14 +117,14 @@ def _generate_code_for_client_method(method: ProtoServiceMethod,
         raise NotImplementedError(
             'Only unary and server streaming RPCs are currently supported')
 
-    call_alias = f'{method.name()}Call'
+    call_alias = f'{name}Call'
 
     output.write_line()
     output.write_line(
         f'using {call_alias} = {RPC_NAMESPACE}::NanopbClientCall<')
     output.write_line(f'    {callbacks}<{res}>>;')
     output.write_line()
-    output.write_line(f'static {call_alias} {method.name()}(')
+    output.write_line(f'static {call_alias} {name}(')
     with output.indent(4):
         output.write_line(f'{RPC_NAMESPACE}::Channel& channel,')
         output.write_line(f'const {req}& request,')
@@ -140,8 +140,7 @@ def _generate_code_for_client_method(method: ProtoServiceMethod,
         output.write_line(f'{call_alias} call(&channel,')
         with output.indent(len(call_alias) + 6):
             output.write_line('kServiceId,')
-            output.write_line(
-                f'0x{method_id:08x},  // Hash of "{method.name()}"')
+            output.write_line(f'0x{method_id:08x},  // Hash of "{name}"')
 
             moved_functions = (f'std::move({function.name})'
                                for function in functions)
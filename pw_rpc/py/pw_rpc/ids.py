@@ -13,6 +13,8 @@
 # the License.
 """This module defines the string to ID hash used in pw_rpc."""
 
+import functools
+
 HASH_CONSTANT = 65599
 
 
@@ -30,5 +32,9 @@ def hash_65599(string: str) -> int:
     return hash_value
 
 
-# Function that converts a name to an ID.
-calculate = hash_65599
+# Function that converts a name to an ID. The same service and method names are
+# hashed repeatedly, both by the code generators and by the client when looking
+# up RPCs by name, so the results are cached. The cache is bounded so that
+# long-running clients that look up many different names don't grow without
+# limit.
+calculate = functools.lru_cache(maxsize=1024)(hash_65599)